@@ -5,6 +5,18 @@ load_dotenv()
 
 API_URL = "https://epsd.kz/Modules/Banks/Projects/GetBankProjects"
 ROWS_PER_PAGE = 2000
+PAGE_FETCH_CONCURRENCY = 8
+# jqGrid column names for server-side filtering (client-side only if unset)
+API_NAME_FIELD = os.getenv("API_NAME_FIELD", "")
+API_STATUS_FIELD = os.getenv("API_STATUS_FIELD", "")
+SCRAPE_CONCURRENCY = 32
+SCRAPE_CACHE_TTL = "7 days"
+
+HTTP_HEADERS = {"Accept-Encoding": "br, gzip"}
+HTTP_RETRIES = 3
+HTTP_RETRY_BACKOFF = 0.2
+HTTP_RETRY_STATUSES = (500, 502, 503, 504)
+
 
 DB_CONFIG = {
     "host": os.getenv("DB_HOST", "localhost"),
@@ -1,13 +1,74 @@
+import io
+import threading
+from contextlib import contextmanager
 import psycopg2
-from psycopg2.extras import execute_batch, RealDictCursor
-from config import DB_CONFIG
+import pyarrow.csv as pa_csv
+from psycopg2.extras import execute_values, RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
+from config import DB_CONFIG, SCRAPE_CACHE_TTL
+
+# psdinfo column -> projects table column (see models.projects_table)
+STAGE_COLUMN_SOURCES = {
+    "psdid": "project_id",
+    "title": "project_name",
+    "client": "customer",
+    "designer": "contractor",
+    "report_number": "contract_number",
+    "report_date": "contract_date",
+    "review_place": "branch",
+    "status": "status",
+    "cost_description": "note"
+}
+STAGE_COLUMNS = ", ".join(STAGE_COLUMN_SOURCES)
+KATO_UPDATE_BATCH_SIZE = 500
+EMPTY_KATO_ITERSIZE = 2000
+POOL_MIN_CONNECTIONS = 1
+POOL_MAX_CONNECTIONS = 16
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    """
+    Return the shared connection pool, creating it on first use.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadedConnectionPool(
+                    POOL_MIN_CONNECTIONS, POOL_MAX_CONNECTIONS, **DB_CONFIG
+                )
+    return _pool
 
 
 def get_connection():
     """
-    Create and return a database connection.
+    Take a database connection from the shared pool.
+    Must be returned with put_connection().
+    """
+    return _get_pool().getconn()
+
+
+def put_connection(conn):
+    """
+    Return a connection to the shared pool.
+    An unfinished transaction is rolled back by the pool.
     """
-    return psycopg2.connect(**DB_CONFIG)
+    _get_pool().putconn(conn)
+
+
+@contextmanager
+def connection():
+    """
+    Context manager around get_connection() / put_connection().
+    """
+    conn = get_connection()
+    try:
+        yield conn
+    finally:
+        put_connection(conn)
 
 
 def create_table():
@@ -35,10 +96,12 @@ def create_table():
     );
     """
 
-    cursor.execute(create_table_query)
-    conn.commit()
-    cursor.close()
-    conn.close()
+    try:
+        cursor.execute(create_table_query)
+        conn.commit()
+    finally:
+        cursor.close()
+        put_connection(conn)
 
 
 def ensure_unique_constraint():
@@ -63,20 +126,80 @@ def ensure_unique_constraint():
         print(f"Note: {e}")
     finally:
         cursor.close()
-        conn.close()
+        put_connection(conn)
+
+
+def ensure_kato_indexes():
+    """
+    Create indexes used by the legacy SQL find_kato_code() lookup if they don't exist.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_katocode_parent_name_trim
+        ON katoCode (parent_code, LOWER(TRIM(name_ru)))
+        """)
+        cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_katocode_name_lower
+        ON katoCode (LOWER(TRIM(name_ru)))
+        """)
+        conn.commit()
+    finally:
+        cursor.close()
+        put_connection(conn)
+
+
+def create_scrape_cache_table():
+    """
+    Create the kato_scrape_cache table if it doesn't exist.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    create_table_query = """
+    CREATE UNLOGGED TABLE IF NOT EXISTS kato_scrape_cache (
+        psdid INT4 PRIMARY KEY,
+        names TEXT[],
+        fetched_at TIMESTAMPTZ DEFAULT now()
+    );
+    """
+
+    try:
+        cursor.execute(create_table_query)
+        conn.commit()
+    finally:
+        cursor.close()
+        put_connection(conn)
+
+
+def _dedupe_by_psdid(projects):
+    """
+    Keep only the last row for each project_id.
+    A single-statement ON CONFLICT DO UPDATE cannot touch the same psdid twice,
+    and the last occurrence is what row-by-row upserts used to leave behind.
+    """
+    last_index = {
+        psdid: index
+        for index, psdid in enumerate(projects.column("project_id").to_pylist())
+    }
+    if len(last_index) == projects.num_rows:
+        return projects
+    return projects.take(sorted(last_index.values()))
 
 
 def sync_projects(projects):
     """
     Synchronize projects with database:
-    1. Delete projects from DB that don't exist in fresh API data
-    2. Update existing projects
-    3. Insert new projects
+    1. COPY fresh data into the psdinfo_stage table
+    2. Delete projects from DB that don't exist in psdinfo_stage
+    3. Update existing / insert new projects from psdinfo_stage
 
     Args:
-        projects: List of Project objects from API
+        projects: Table of projects from API (see models.projects_table)
     """
-    if not projects:
+    if projects is None or projects.num_rows == 0:
         print("No projects to sync")
         return
 
@@ -84,21 +207,43 @@ def sync_projects(projects):
     cursor = conn.cursor()
 
     try:
-        fresh_psd_ids = [p.project_id for p in projects]
-        # Step 1: Delete outdated records (exist in DB but not in fresh data)
+        # Step 1: Bulk load fresh data into the staging table via COPY
+        cursor.execute("""
+        CREATE UNLOGGED TABLE IF NOT EXISTS psdinfo_stage (LIKE psdinfo INCLUDING DEFAULTS)
+        """)
+        cursor.execute("TRUNCATE psdinfo_stage")
+
+        stage_table = _dedupe_by_psdid(projects).select(list(STAGE_COLUMN_SOURCES.values()))
+        buffer = io.BytesIO()
+        pa_csv.write_csv(
+            stage_table,
+            buffer,
+            write_options=pa_csv.WriteOptions(include_header=False)
+        )
+        buffer.seek(0)
+
+        cursor.copy_expert(f"""
+        COPY psdinfo_stage ({STAGE_COLUMNS})
+        FROM STDIN WITH (FORMAT csv)
+        """, buffer)
+        cursor.execute("ANALYZE psdinfo_stage")
+
+        # Step 2: Delete outdated records (exist in DB but not in fresh data)
         delete_query = """
-        DELETE FROM psdinfo
-        WHERE psdid NOT IN %s
+        DELETE FROM psdinfo p
+        WHERE NOT EXISTS (
+            SELECT 1 FROM psdinfo_stage s WHERE s.psdid = p.psdid
+        )
         """
-        cursor.execute(delete_query, (tuple(fresh_psd_ids),))
+        cursor.execute(delete_query)
         deleted_count = cursor.rowcount
         print(f"Deleted {deleted_count} outdated records")
 
-        # Step 2 & 3: Upsert (Update or Insert)
-        upsert_query = """
-        INSERT INTO psdinfo (psdid, title, client, designer, report_number, report_date,
-                             review_place, status, cost_description, updated_at)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, now())
+        # Step 3: Upsert (Update or Insert) from staging
+        upsert_query = f"""
+        INSERT INTO psdinfo ({STAGE_COLUMNS}, updated_at)
+        SELECT {STAGE_COLUMNS}, now()
+        FROM psdinfo_stage
         ON CONFLICT (psdid)
         DO UPDATE SET
             title = EXCLUDED.title,
@@ -111,23 +256,8 @@ def sync_projects(projects):
             cost_description = EXCLUDED.cost_description,
             updated_at = now()
         """
-
-        batch_data = []
-        for project in projects:
-            batch_data.append((
-                project.project_id,
-                project.project_name,
-                project.customer,
-                project.contractor,
-                project.contract_number,
-                project.contract_date,
-                project.branch,
-                project.status,
-                project.note
-            ))
-
-        execute_batch(cursor, upsert_query, batch_data)
-        print(f"Upserted {len(batch_data)} projects")
+        cursor.execute(upsert_query)
+        print(f"Upserted {cursor.rowcount} projects")
 
         conn.commit()
         print("Database synchronized successfully")
@@ -138,18 +268,20 @@ def sync_projects(projects):
         raise
     finally:
         cursor.close()
-        conn.close()
+        put_connection(conn)
 
 
-def get_empty_kato_records():
+def iter_empty_kato_records():
     """
-    Get all records where katoCode is NULL or empty.
+    Stream records where katoCode is NULL or empty through a server-side cursor,
+    fetching EMPTY_KATO_ITERSIZE rows per round trip.
 
-    Returns:
-        List of tuples (psdid, title)
+    Yields:
+        Tuples (psdid, title)
     """
     conn = get_connection()
-    cursor = conn.cursor()
+    cursor = conn.cursor(name="empty_kato")
+    cursor.itersize = EMPTY_KATO_ITERSIZE
 
     try:
         query = """
@@ -158,11 +290,10 @@ def get_empty_kato_records():
         WHERE katoCode IS NULL OR katoCode = ''
         """
         cursor.execute(query)
-        records = cursor.fetchall()
-        return records
+        yield from cursor
     finally:
         cursor.close()
-        conn.close()
+        put_connection(conn)
 
 
 def find_kato_code(kato_names, matcher=None):
@@ -183,52 +314,148 @@ def find_kato_code(kato_names, matcher=None):
     if matcher:
         return matcher.find_kato_code(kato_names)
 
-    # Legacy fallback (simple matching)
+    # Legacy fallback: walk the katoCode hierarchy in SQL
     conn = get_connection()
     cursor = conn.cursor()
 
     try:
-        # Start from the most specific (last) name and work backwards
-        for name in reversed(kato_names):
-            query = """
-            SELECT code FROM katoCode
-            WHERE LOWER(TRIM(name_ru)) = LOWER(TRIM(%s))
-            ORDER BY level DESC
-            LIMIT 1
-            """
-            cursor.execute(query, (name,))
-            result = cursor.fetchone()
-            if result:
-                return result[0]
-
-        return None
+        names = [name.strip().lower() for name in kato_names]
+        walk_query = """
+        WITH RECURSIVE walk AS (
+            SELECT code, level
+            FROM katoCode
+            WHERE (parent_code IS NULL OR parent_code = '')
+              AND LOWER(TRIM(name_ru)) = ANY(%s)
+            UNION ALL
+            SELECT k.code, k.level
+            FROM katoCode k
+            JOIN walk ON k.parent_code = walk.code
+            WHERE LOWER(TRIM(k.name_ru)) = ANY(%s)
+        )
+        SELECT code FROM walk
+        ORDER BY level DESC
+        LIMIT 1
+        """
+        cursor.execute(walk_query, (names, names))
+        result = cursor.fetchone()
+        if result:
+            return result[0]
+
+        # No hierarchical path: prefer the most specific (last) name that matches
+        reversed_names = names[::-1]
+        flat_query = """
+        SELECT code FROM katoCode
+        WHERE LOWER(TRIM(name_ru)) = ANY(%s)
+        ORDER BY array_position(%s::text[], LOWER(TRIM(name_ru))), level DESC
+        LIMIT 1
+        """
+        cursor.execute(flat_query, (reversed_names, reversed_names))
+        result = cursor.fetchone()
+        return result[0] if result else None
     finally:
         cursor.close()
-        conn.close()
+        put_connection(conn)
 
 
-def update_kato_code(psdid, kato_code):
+def update_kato_codes_bulk(pairs):
     """
-    Update katoCode for a specific psdid.
+    Update katoCode for many psdids in a single statement.
 
     Args:
-        psdid: Project ID
-        kato_code: KATO code to update
+        pairs: List of tuples (psdid, kato_code)
+
+    Returns:
+        Number of updated rows
     """
+    if not pairs:
+        return 0
+
     conn = get_connection()
     cursor = conn.cursor()
 
     try:
         query = """
         UPDATE psdinfo
-        SET katoCode = %s, updated_at = now()
-        WHERE psdid = %s
+        SET katoCode = v.kato_code, updated_at = now()
+        FROM (VALUES %s) AS v(psdid, kato_code)
+        WHERE psdinfo.psdid = v.psdid
+        """
+        updated_count = 0
+        for start in range(0, len(pairs), KATO_UPDATE_BATCH_SIZE):
+            batch = pairs[start:start + KATO_UPDATE_BATCH_SIZE]
+            execute_values(cursor, query, batch, template="(%s, %s)", page_size=len(batch))
+            updated_count += cursor.rowcount
+        conn.commit()
+        return updated_count
+    except Exception as e:
+        conn.rollback()
+        print(f"Error updating {len(pairs)} KATO codes: {e}")
+        raise
+    finally:
+        cursor.close()
+        put_connection(conn)
+
+
+def get_cached_kato_names(psdids):
+    """
+    Get scraped KATO names that are still fresh in kato_scrape_cache.
+
+    Args:
+        psdids: List of project IDs
+
+    Returns:
+        Dict psdid -> list of KATO names
+    """
+    if not psdids:
+        return {}
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        query = """
+        SELECT psdid, names
+        FROM kato_scrape_cache
+        WHERE psdid = ANY(%s) AND fetched_at > now() - %s::interval
+        """
+        cursor.execute(query, (list(psdids), SCRAPE_CACHE_TTL))
+        return dict(cursor.fetchall())
+    finally:
+        cursor.close()
+        put_connection(conn)
+
+
+def cache_kato_names(kato_names_by_psdid):
+    """
+    Store scraped KATO names in kato_scrape_cache.
+
+    Args:
+        kato_names_by_psdid: Dict psdid -> list of KATO names
+    """
+    if not kato_names_by_psdid:
+        return
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        query = """
+        INSERT INTO kato_scrape_cache (psdid, names, fetched_at)
+        VALUES %s
+        ON CONFLICT (psdid)
+        DO UPDATE SET names = EXCLUDED.names, fetched_at = now()
         """
-        cursor.execute(query, (kato_code, psdid))
+        execute_values(
+            cursor,
+            query,
+            list(kato_names_by_psdid.items()),
+            template="(%s, %s, now())",
+            page_size=500
+        )
         conn.commit()
     except Exception as e:
         conn.rollback()
-        print(f"Error updating psdid {psdid}: {e}")
+        print(f"Error caching scraped KATO names: {e}")
     finally:
         cursor.close()
-        conn.close()
+        put_connection(conn)
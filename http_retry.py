@@ -0,0 +1,27 @@
+import asyncio
+from config import HTTP_RETRIES, HTTP_RETRY_BACKOFF, HTTP_RETRY_STATUSES
+
+
+async def send_with_retries(send, status_of, retry_exceptions=()):
+    """
+    Await send() again while the response status is in HTTP_RETRY_STATUSES
+    or it raises one of retry_exceptions, backing off exponentially.
+
+    Args:
+        send: Coroutine function performing one request
+        status_of: Returns the HTTP status code of a response
+        retry_exceptions: Exception types worth retrying (e.g. connection errors)
+
+    Returns:
+        The last response; the last exception is re-raised once retries run out
+    """
+    for attempt in range(HTTP_RETRIES + 1):
+        try:
+            response = await send()
+        except retry_exceptions:
+            if attempt == HTTP_RETRIES:
+                raise
+        else:
+            if status_of(response) not in HTTP_RETRY_STATUSES or attempt == HTTP_RETRIES:
+                return response
+        await asyncio.sleep(HTTP_RETRY_BACKOFF * 2 ** attempt)
@@ -1,6 +1,8 @@
-import psycopg2
-from config import DB_CONFIG
-from typing import Optional, Dict, List
+import re
+from collections import defaultdict
+from functools import lru_cache
+from data import connection
+from typing import Optional, Dict, List, Set, Tuple
 
 
 class KatoMatcher:
@@ -8,99 +10,134 @@ class KatoMatcher:
     Hierarchical KATO code matcher with caching and normalization.
     """
 
+    _ABBREVIATIONS = {
+        'р-н': 'район',
+        'р-на': 'района',
+        'р-ну': 'району',
+        'р.': 'район',
+        'обл.': 'область',
+        'обл': 'область',
+        'г.': 'город',
+        'г': 'город',
+        'с.': 'село',
+        'с': 'село',
+        'п.': 'поселок',
+        'п': 'поселок',
+        'а.': 'аул',
+        'а': 'аул',
+        'кент': 'кент',
+        'ауыл': 'село'
+    }
+
+    # Name aliases for renamed cities (Нур-Султан -> Астана)
+    _NAME_ALIASES = {
+        'нур-султан': 'астана',
+        'нұр-сұлтан': 'астана'
+    }
+
+    # Either a run of whitespace or a whole whitespace-delimited abbreviation
+    # (longest first, so 'р-на' wins over 'р-н')
+    _WORD_RE = re.compile(
+        r'\s+|(?<!\S)('
+        + '|'.join(re.escape(k) for k in sorted(_ABBREVIATIONS, key=len, reverse=True))
+        + r')(?!\S)'
+    )
+
     def __init__(self):
         self.kato_tree = {}
         self.kato_by_code = {}
+        # parent_code ('' for root) -> {normalized_name: node}
+        self.by_parent: Dict[str, Dict[str, dict]] = {}
+        # normalized_name -> nodes with that name, in load order
+        self.by_name: Dict[str, List[dict]] = defaultdict(list)
+        # 3-character substring of normalized_name -> codes containing it
+        self.by_trigram: Dict[str, Set[str]] = defaultdict(set)
+        # (parent_code, word) -> (position in children dict, child) for children
+        # of parent_code whose name contains that word
+        self.by_parent_token: Dict[Tuple[str, str], List[Tuple[int, dict]]] = defaultdict(list)
+        # tuple of raw kato_names -> resolved code (or None)
+        self._cache: Dict[Tuple[str, ...], Optional[str]] = {}
         self._load_kato_data()
 
-    def _normalize_name(self, name: str) -> str:
+    @staticmethod
+    @lru_cache(maxsize=16384)
+    def _normalize_name(name: str) -> str:
         """
         Normalize KATO name by:
         - Converting to lowercase
         - Removing extra whitespace
         - Expanding abbreviations: р-н → район, обл. → область, г. → город
         """
-        name = name.lower().strip()
-
-        # Split by words and expand abbreviations for each word
-        words = name.split()
-        normalized_words = []
-
-        abbreviations = {
-            'р-н': 'район',
-            'р-на': 'района',
-            'р-ну': 'району',
-            'р.': 'район',
-            'обл.': 'область',
-            'обл': 'область',
-            'г.': 'город',
-            'г': 'город',
-            'с.': 'село',
-            'с': 'село',
-            'п.': 'поселок',
-            'п': 'поселок',
-            'а.': 'аул',
-            'а': 'аул',
-            'кент': 'кент',
-            'ауыл': 'село'
-        }
-
-        for word in words:
-            # Check if this word is an abbreviation
-            if word in abbreviations:
-                normalized_words.append(abbreviations[word])
-            else:
-                normalized_words.append(word)
-
-        # Join back and remove extra spaces
-        name = ' '.join(normalized_words)
+        return KatoMatcher._WORD_RE.sub(KatoMatcher._expand_word, name.lower().strip())
 
-        return name
+    @staticmethod
+    def _expand_word(match) -> str:
+        """
+        Substitution for _WORD_RE: collapse whitespace, expand abbreviations.
+        """
+        abbreviation = match.group(1)
+        if abbreviation is None:
+            return ' '
+        return KatoMatcher._ABBREVIATIONS[abbreviation]
 
     def _load_kato_data(self):
         """
         Load KATO data from database and build a hierarchical tree structure.
         Tree structure: {parent_code: {normalized_name: {code, name, children}}}
         """
-        conn = psycopg2.connect(**DB_CONFIG)
-        cursor = conn.cursor()
-
-        try:
-            query = """
-            SELECT code, name_ru, parent_code, level
-            FROM katoCode
-            ORDER BY level, code
-            """
-            cursor.execute(query)
-            rows = cursor.fetchall()
-
-            # Build flat lookup
-            for code, name_ru, parent_code, level in rows:
-                normalized_name = self._normalize_name(name_ru)
-                self.kato_by_code[code] = {
-                    'code': code,
-                    'name_ru': name_ru,
-                    'normalized_name': normalized_name,
-                    'parent_code': parent_code,
-                    'level': level,
-                    'children': {}
-                }
-
-            # Build tree structure
-            for code, data in self.kato_by_code.items():
-                parent_code = data['parent_code']
-                if parent_code and parent_code in self.kato_by_code:
-                    parent = self.kato_by_code[parent_code]
-                    parent['children'][data['normalized_name']] = data
-                elif not parent_code or parent_code == '':
-                    # Root level
-                    self.kato_tree[data['normalized_name']] = data
-
-            print(f"Loaded {len(self.kato_by_code)} KATO codes")
-
-        finally:
-            cursor.close()
-            conn.close()
+        query = """
+        SELECT code, name_ru, parent_code, level
+        FROM katoCode
+        ORDER BY level, code
+        """
+
+        with connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(query)
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+
+        # Build flat lookup
+        for code, name_ru, parent_code, level in rows:
+            normalized_name = self._normalize_name(name_ru)
+            self.kato_by_code[code] = {
+                'code': code,
+                'name_ru': name_ru,
+                'normalized_name': normalized_name,
+                'parent_code': parent_code,
+                'level': level,
+                'children': {}
+            }
+
+        # Build tree structure and lookup indexes
+        self.by_parent[''] = self.kato_tree
+        for order, (code, data) in enumerate(self.kato_by_code.items()):
+            data['order'] = order
+            parent_code = data['parent_code']
+            if parent_code and parent_code in self.kato_by_code:
+                parent = self.kato_by_code[parent_code]
+                parent['children'][data['normalized_name']] = data
+            elif not parent_code or parent_code == '':
+                # Root level
+                self.kato_tree[data['normalized_name']] = data
+
+            # Children dicts double as the per-parent exact-match index
+            self.by_parent[code] = data['children']
+            self.by_name[data['normalized_name']].append(data)
+            for trigram in self._trigrams(data['normalized_name']):
+                self.by_trigram[trigram].add(code)
+
+        # Built from the finished children dicts, so a duplicate name under one
+        # parent resolves as in the exact/partial lookups: the later node, at
+        # the position where the name was first inserted
+        for parent_code, children in self.by_parent.items():
+            for position, (node_name, node) in enumerate(children.items()):
+                for token in set(node_name.split()):
+                    self.by_parent_token[(parent_code, token)].append((position, node))
+
+        print(f"Loaded {len(self.kato_by_code)} KATO codes")
 
     def find_kato_code(self, kato_names: List[str]) -> Optional[str]:
         """
@@ -116,19 +153,22 @@ class KatoMatcher:
         if not kato_names:
             return None
 
-        # Name aliases for renamed cities (Нур-Султан -> Астана)
-        name_aliases = {
-            'нур-султан': 'астана',
-            'нұр-сұлтан': 'астана'
-        }
+        key = tuple(kato_names)
+        if key not in self._cache:
+            self._cache[key] = self._resolve(kato_names)
+        return self._cache[key]
 
+    def _resolve(self, kato_names: List[str]) -> Optional[str]:
+        """
+        Uncached body of find_kato_code().
+        """
         # Skip "Республика Казахстан" (level 0)
         filtered_names = []
         for name in kato_names:
             normalized = self._normalize_name(name)
             if 'республика казахстан' not in normalized:
                 # Apply aliases
-                for old_name, new_name in name_aliases.items():
+                for old_name, new_name in self._NAME_ALIASES.items():
                     if old_name in normalized:
                         normalized = normalized.replace(old_name, new_name)
                 filtered_names.append(normalized)
@@ -137,47 +177,102 @@ class KatoMatcher:
             return None
 
         # Start from root and traverse down the tree
-        current_nodes = self.kato_tree
+        current_parent_code = ''
         matched_code = None
 
         for name in filtered_names:
-            # Try to find match in current level
-            found = False
-            for node_name, node_data in current_nodes.items():
-                # Exact match or partial match
-                if name in node_name or node_name in name:
-                    matched_code = node_data['code']
-                    current_nodes = node_data['children']
-                    found = True
-                    break
-
-            if not found:
-                # Try fuzzy matching - check if any words match
-                name_words = set(name.split())
-                for node_name, node_data in current_nodes.items():
-                    node_words = set(node_name.split())
-                    # If at least 1 significant word matches
-                    common_words = name_words & node_words
-                    if common_words:
-                        matched_code = node_data['code']
-                        current_nodes = node_data['children']
-                        found = True
-                        break
-
-            if not found:
-                # Fallback: search globally for the most specific name (last in list)
-                if name == filtered_names[-1]:
-                    # Search for this name across all KATO codes
-                    for code, data in self.kato_by_code.items():
-                        if name in data['normalized_name'] or data['normalized_name'] in name:
-                            matched_code = data['code']
-                            return matched_code
-                # No match found, return last matched code or continue
-                if matched_code:
-                    break
+            node = self._match_child(current_parent_code, name)
+
+            if node:
+                matched_code = node['code']
+                current_parent_code = matched_code
+                continue
+
+            # Fallback: search globally for the most specific name (last in list)
+            if name == filtered_names[-1]:
+                node = self._match_global(name)
+                if node:
+                    return node['code']
+            # No match found, return last matched code or continue
+            if matched_code:
+                break
 
         return matched_code
 
+    def _match_child(self, parent_code: str, name: str) -> Optional[dict]:
+        """
+        Match a normalized name among the children of parent_code
+        ('' for root): exact, then partial, then by common words.
+        """
+        children = self.by_parent.get(parent_code, {})
+
+        node = children.get(name)
+        if node:
+            return node
+
+        for node_name, node_data in children.items():
+            if name in node_name or node_name in name:
+                return node_data
+
+        # Fuzzy matching - first child (in children order) with a word in common
+        candidates = [
+            entries[0]
+            for entries in (self.by_parent_token.get((parent_code, token)) for token in set(name.split()))
+            if entries
+        ]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda entry: entry[0])[1]
+
+    def _match_global(self, name: str) -> Optional[dict]:
+        """
+        Match a normalized name across all KATO codes (partial match either way)
+        using the name and trigram indexes instead of scanning every code.
+        """
+        # KATO names contained in the query: look up every substring of it
+        substrings = {
+            name[start:end]
+            for start in range(len(name) + 1)
+            for end in range(start, len(name) + 1)
+        }
+        candidates = [
+            node
+            for substring in substrings
+            for node in self.by_name.get(substring, ())
+        ]
+
+        # KATO names containing the query: they must contain all of its trigrams
+        trigrams = self._trigrams(name)
+        if trigrams:
+            code_sets = sorted(
+                (self.by_trigram.get(trigram, set()) for trigram in trigrams), key=len
+            )
+            codes = code_sets[0].intersection(*code_sets[1:])
+        else:
+            codes = self.kato_by_code
+        candidates.extend(
+            self.kato_by_code[code]
+            for code in codes
+            if name in self.kato_by_code[code]['normalized_name']
+        )
+        return self._first_in_order(candidates)
+
+    @staticmethod
+    def _trigrams(name: str) -> Set[str]:
+        """
+        All 3-character substrings of a name (empty for shorter names).
+        """
+        return {name[i:i + 3] for i in range(len(name) - 2)}
+
+    @staticmethod
+    def _first_in_order(candidates: List[dict]) -> Optional[dict]:
+        """
+        Pick the candidate that was loaded first (ORDER BY level, code).
+        """
+        if not candidates:
+            return None
+        return min(candidates, key=lambda node: node['order'])
+
     def find_by_parent(self, parent_code: str, name: str) -> Optional[str]:
         """
         Find KATO code by parent code and name.
@@ -195,6 +290,10 @@ class KatoMatcher:
         normalized_name = self._normalize_name(name)
         parent_node = self.kato_by_code[parent_code]
 
+        child = parent_node['children'].get(normalized_name)
+        if child:
+            return child['code']
+
         for child_name, child_data in parent_node['children'].items():
             if normalized_name in child_name or child_name in normalized_name:
                 return child_data['code']
@@ -1,5 +1,5 @@
 from service import fetch_all_projects
-from data import ensure_unique_constraint, sync_projects
+from data import ensure_kato_indexes, ensure_unique_constraint, sync_projects
 
 
 def main():
@@ -9,10 +9,11 @@ def main():
 
     if projects and len(projects) > 0:
         print("\nFirst project example:")
-        print(projects[0].__dict__)
+        print(projects.slice(0, 1).to_pylist()[0])
 
         print("\n=== Step 6: Syncing data to PostgreSQL ===")
         ensure_unique_constraint()
+        ensure_kato_indexes()
         sync_projects(projects)
         print("\nSync completed!")
     else:
@@ -1,3 +1,3 @@
-from .project import Project
+from .project import CELL_COLUMNS, projects_table
 
-__all__ = ["Project"]
+__all__ = ["CELL_COLUMNS", "projects_table"]
@@ -1,36 +1,47 @@
-from datetime import datetime
-
-
-class Project:
-    def __init__(self, row_data):
-        self.id = row_data["id"]
-        cell = row_data["cell"]
-
-        self.project_id = cell[0] if len(cell) > 0 else None
-        self.field_1 = cell[1] if len(cell) > 1 else None
-        self.project_name = cell[2] if len(cell) > 2 else None
-        self.customer = cell[3] if len(cell) > 3 else None
-        self.contractor = cell[4] if len(cell) > 4 else None
-        self.contract_number = cell[5] if len(cell) > 5 else None
-        self.contract_date = self._parse_date(cell[6]) if len(cell) > 6 else None
-        self.branch = cell[7] if len(cell) > 7 else None
-        self.status = cell[8] if len(cell) > 8 else None
-        self.field_9 = cell[9] if len(cell) > 9 else None
-        self.note = cell[10] if len(cell) > 10 else None
-        self.field_11 = cell[11] if len(cell) > 11 else None
-        self.field_12 = cell[12] if len(cell) > 12 else None
-
-    def _parse_date(self, date_str):
-        """
-        Convert date from DD.MM.YYYY to YYYY-MM-DD format.
-        """
-        if not date_str:
-            return None
-        try:
-            dt = datetime.strptime(date_str, "%d.%m.%Y")
-            return dt.strftime("%Y-%m-%d")
-        except ValueError:
-            return None
-
-    def __repr__(self):
-        return f"Project(id={self.id}, name={self.project_name[:50]}...)"
+from itertools import zip_longest
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Project attribute -> index in the API row "cell" list
+CELL_COLUMNS = {
+    "project_id": 0,
+    "project_name": 2,
+    "customer": 3,
+    "contractor": 4,
+    "contract_number": 5,
+    "contract_date": 6,
+    "branch": 7,
+    "status": 8,
+    "note": 10
+}
+
+
+def _string_column(values):
+    """
+    Convert one cell position to a string Arrow array, stringifying any
+    non-string cells.
+    """
+    try:
+        return pa.array(values, type=pa.string())
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([None if value is None else str(value) for value in values], type=pa.string())
+
+
+def projects_table(rows):
+    """
+    Build a columnar table of projects from raw API rows.
+    Missing trailing cells become nulls; contract_date is date32.
+    """
+    # Transpose the cell lists once instead of indexing every row per column
+    cells = list(zip_longest(*(row["cell"] for row in rows)))
+    missing = [None] * len(rows)
+
+    columns = {"id": pa.array([row["id"] for row in rows])}
+    for name, index in CELL_COLUMNS.items():
+        columns[name] = _string_column(cells[index] if index < len(cells) else missing)
+
+    columns["contract_date"] = pc.strptime(
+        columns["contract_date"], format="%d.%m.%Y", unit="s", error_is_null=True
+    ).cast(pa.date32())
+
+    return pa.table(columns)
@@ -1,90 +1,139 @@
-from data import get_empty_kato_records, find_kato_code, update_kato_code
-from scraper import scrape_kato_from_project
+from data import (
+    create_scrape_cache_table, iter_empty_kato_records,
+    find_kato_code, update_kato_codes_bulk
+)
+from scraper import scrape_all
 from kato_matcher import KatoMatcher
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from config import SCRAPE_CONCURRENCY
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+import asyncio
+import multiprocessing
+import os
 
+# Records handed to a worker process at a time while streaming from psdinfo
+BATCH_SIZE = 500
 
-def process_kato_codes():
-    """
-    Main function to process KATO codes:
-    1. Get records with empty katoCode
-    2. Scrape KATO naming from partial view
-    3. Find matching code from katoCode table (hierarchical)
-    4. Update psdinfo with the code
-    """
-    print("=== Starting KATO Code Processing ===\n")
-
-    # Initialize KATO matcher (loads data once, caches in memory)
-    print("Initializing KATO matcher...")
-    matcher = KatoMatcher()
-    print()
+# Per-process state, set up by _init_worker()
+_matcher = None
+_scrape_concurrency = SCRAPE_CONCURRENCY
 
-    # Step 1: Get records with empty katoCode
-    print("Step 1: Fetching records with empty katoCode...")
-    records = get_empty_kato_records()
-    print(f"Found {len(records)} records to process\n")
 
-    if not records:
-        print("No records to process. Done!")
-        return
-
-    success_count = 0
-    fail_count = 0
-
-    def process_single_record(record_info):
-        """Process a single record"""
-        idx, psdid, title = record_info
-
-        print(f"[{idx}/{len(records)}] Processing psdid: {psdid}")
-        print(f"  Title: {title[:60]}...")
-
-        # Step 2: Scrape KATO naming
-        kato_names = scrape_kato_from_project(psdid)
+def _init_worker(scrape_concurrency):
+    """
+    Build the KATO matcher once per worker process.
+    """
+    global _matcher, _scrape_concurrency
+    _matcher = KatoMatcher()
+    _scrape_concurrency = scrape_concurrency
 
-        if not kato_names:
-            print(f"  ❌ Could not scrape KATO names")
-            return False
 
-        print(f"  Found KATO: {' -> '.join(kato_names)}")
+def process_batch(records):
+    """
+    Scrape and match one batch of records in a worker process.
 
-        # Step 3: Find matching code (using hierarchical matcher)
-        kato_code = find_kato_code(kato_names, matcher=matcher)
+    Args:
+        records: List of tuples (psdid, title)
 
+    Returns:
+        List of matched tuples (psdid, kato_code)
+    """
+    # Step 2: Scrape KATO naming
+    psdids = [psdid for psdid, _title in records]
+    scraped = {
+        psdid: kato_names
+        for psdid, kato_names in asyncio.run(scrape_all(psdids, _scrape_concurrency)).items()
+        if kato_names
+    }
+
+    # Step 3: Find matching codes (using hierarchical matcher)
+    resolved = [
+        (psdid, find_kato_code(kato_names, matcher=_matcher))
+        for psdid, kato_names in scraped.items()
+    ]
+    matched_pairs = [(psdid, kato_code) for psdid, kato_code in resolved if kato_code]
+    for psdid, kato_code in resolved:
         if not kato_code:
-            print(f"  ❌ Could not find matching KATO code in database")
-            return False
+            print(f"  ❌ Could not find matching KATO code for psdid {psdid}: "
+                  f"{' -> '.join(scraped[psdid])}")
 
-        print(f"  Matched code: {kato_code}")
+    print(f"Batch: scraped {len(scraped)}, matched {len(matched_pairs)} of {len(records)} records")
+    return matched_pairs
 
-        # Step 4: Update database
-        update_kato_code(psdid, kato_code)
-        print(f"  ✓ Updated successfully")
-        return True
 
-    # Process records in parallel with max 5 workers
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        # Prepare data for parallel processing
-        record_infos = [(idx, psdid, title) for idx, (psdid, title) in enumerate(records, 1)]
+def process_kato_codes():
+    """
+    Main function to process KATO codes:
+    1. Stream records with empty katoCode in batches of BATCH_SIZE
+    2. Scrape KATO naming from partial view (worker processes, async inside each)
+    3. Find matching codes from katoCode table (hierarchical, in memory per worker)
+    4. Update psdinfo with each batch's matched codes in one statement
+    """
+    print("=== Starting KATO Code Processing ===\n")
+
+    create_scrape_cache_table()
 
-        # Submit all tasks
-        futures = {executor.submit(process_single_record, info): info for info in record_infos}
+    # Step 1: Stream records with empty katoCode
+    print("Step 1: Streaming records with empty katoCode...")
+    records = iter_empty_kato_records()
+    total_count = 0
+    success_count = 0
+    pending = set()
 
-        # Collect results as they complete
-        for future in as_completed(futures):
+    def collect(done):
+        # Step 4: Update database in one batch per finished worker batch
+        nonlocal success_count
+        for future in done:
             try:
-                success = future.result()
-                if success:
-                    success_count += 1
-                else:
-                    fail_count += 1
+                matched_pairs = future.result()
             except Exception as e:
                 print(f"  ❌ Exception: {e}")
-                fail_count += 1
+                continue
+            # A failed update only fails this batch; its records count as failed
+            try:
+                updated_count = update_kato_codes_bulk(matched_pairs)
+            except Exception as e:
+                print(f"  ❌ Exception: {e}")
+                continue
+            print(f"  ✓ Updated {updated_count} records")
+            success_count += updated_count
+
+    # Never more workers than scrape slots: each one opens its own DB pool and
+    # loads the full KATO table, and the shares must not exceed SCRAPE_CONCURRENCY
+    workers = min(os.cpu_count() or 1, SCRAPE_CONCURRENCY)
+    print(f"Processing with {workers} worker processes...")
+
+    # Each worker builds its own KATO matcher and gets a share of the scrape concurrency.
+    # spawn: workers must not inherit this process's pooled DB connections
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(SCRAPE_CONCURRENCY // workers,)
+    ) as executor:
+        while True:
+            batch = list(islice(records, BATCH_SIZE))
+            if not batch:
+                break
+
+            total_count += len(batch)
+            pending.add(executor.submit(process_batch, batch))
+
+            # Keep at most two batches per worker in flight
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+
+        collect(wait(pending).done)
+
+    if not total_count:
+        print("No records to process. Done!")
+        return
 
     print(f"\n=== Processing Complete ===")
     print(f"Success: {success_count}")
-    print(f"Failed: {fail_count}")
-    print(f"Total: {len(records)}")
+    print(f"Failed: {total_count - success_count}")
+    print(f"Total: {total_count}")
 
 
 if __name__ == "__main__":
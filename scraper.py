@@ -1,13 +1,69 @@
-import requests
-from bs4 import BeautifulSoup
-from typing import List, Optional
+import asyncio
+import httpx
+from lxml import html
+from typing import Dict, List, Optional
+from config import SCRAPE_CONCURRENCY, HTTP_HEADERS, HTTP_RETRIES
+from http_retry import send_with_retries
+from data import get_cached_kato_names, cache_kato_names
 
+# Second cell of the "Местоположение объекта" row in the project details table
+LOCATION_XPATH = (
+    "//table[contains(@class, 'simple')]"
+    "//tr[td[1][contains(normalize-space(), 'Местоположение объекта')]]/td[2]"
+)
 
-def scrape_kato_from_project(psdid: int) -> Optional[List[str]]:
+
+def create_client() -> httpx.AsyncClient:
+    """
+    Create the shared HTTP/2 keep-alive client used for scraping.
+    Connection failures are retried by the transport.
+    """
+    transport = httpx.AsyncHTTPTransport(
+        http2=True,
+        retries=HTTP_RETRIES,
+        limits=httpx.Limits(max_connections=SCRAPE_CONCURRENCY)
+    )
+    return httpx.AsyncClient(transport=transport, timeout=10, headers=HTTP_HEADERS)
+
+
+def parse_kato_names(
+    content: bytes, psdid: int, encoding: Optional[str] = None
+) -> Optional[List[str]]:
+    """
+    Extract KATO naming from project partial view HTML.
+
+    Args:
+        content: Raw page bytes
+        psdid: Project ID (for logging)
+        encoding: Charset from the Content-Type header; if None, lxml
+            detects it from the document's meta/XML declaration
+
+    Returns:
+        List of KATO names or None
+    """
+    parser = html.HTMLParser(encoding=encoding) if encoding else None
+    tree = html.fromstring(content, parser=parser)
+    cells = tree.xpath(LOCATION_XPATH)
+
+    if not cells:
+        print(f"  ⚠ 'Местоположение объекта' not found for psdid {psdid}")
+        return None
+
+    # Remove trailing semicolon and split by comma
+    kato_text = cells[0].text_content().strip().rstrip(';').strip()
+
+    # Split by comma: "Республика Казахстан, область Жетісу, Каратальский район"
+    kato_names = [name.strip() for name in kato_text.split(',')]
+
+    return kato_names if kato_names else None
+
+
+async def scrape_kato_from_project(client: httpx.AsyncClient, psdid: int) -> Optional[List[str]]:
     """
     Scrape KATO naming from project partial view.
 
     Args:
+        client: Shared client from create_client()
         psdid: Project ID
 
     Returns:
@@ -16,42 +72,49 @@ def scrape_kato_from_project(psdid: int) -> Optional[List[str]]:
     url = f"https://www.epsd.kz/Modules/Banks/Projects/View/{psdid}"
 
     try:
-        response = requests.get(url, timeout=10)
+        response = await send_with_retries(
+            lambda: client.get(url), lambda r: r.status_code
+        )
         response.raise_for_status()
+        return parse_kato_names(response.content, psdid, response.charset_encoding)
+
+    except httpx.HTTPError as e:
+        print(f"  ❌ HTTP Error scraping psdid {psdid}: {e}")
+        return None
+    except Exception as e:
+        print(f"  ❌ Parsing error for psdid {psdid}: {e}")
+        return None
 
-        soup = BeautifulSoup(response.content, 'lxml')
 
-        # a) Find table with class="simple table table-bordered"
-        table = soup.find('table', class_='simple table table-bordered')
+async def scrape_all(
+    psdids: List[int], concurrency: int = SCRAPE_CONCURRENCY
+) -> Dict[int, Optional[List[str]]]:
+    """
+    Scrape KATO naming for many projects concurrently over one shared client.
+    Projects scraped within SCRAPE_CACHE_TTL are served from kato_scrape_cache.
 
-        if not table:
-            print(f"  ⚠ Table not found for psdid {psdid}")
-            return None
+    Args:
+        psdids: Project IDs
+        concurrency: Maximum number of requests in flight
 
-        # b) Find the row with "Местоположение объекта"
-        rows = table.find_all('tr')
-        for row in rows:
-            tds = row.find_all('td')
-            if len(tds) >= 2:
-                first_td_text = tds[0].get_text(strip=True)
-                if 'Местоположение объекта' in first_td_text:
-                    # c) Get text from second td
-                    kato_text = tds[1].get_text(strip=True)
+    Returns:
+        Dict psdid -> list of KATO names (None where scraping failed)
+    """
+    kato_names_by_psdid = get_cached_kato_names(psdids)
+    missing = [psdid for psdid in psdids if psdid not in kato_names_by_psdid]
+    print(f"  {len(kato_names_by_psdid)} cached, {len(missing)} to scrape")
 
-                    # Remove trailing semicolon and split by comma
-                    kato_text = kato_text.rstrip(';').strip()
+    semaphore = asyncio.Semaphore(concurrency)
 
-                    # Split by comma: "Республика Казахстан, область Жетісу, Каратальский район"
-                    kato_names = [name.strip() for name in kato_text.split(',')]
+    async with create_client() as client:
+        async def scrape(psdid):
+            async with semaphore:
+                return await scrape_kato_from_project(client, psdid)
 
-                    return kato_names if kato_names else None
+        results = await asyncio.gather(*(scrape(psdid) for psdid in missing))
 
-        print(f"  ⚠ 'Местоположение объекта' not found for psdid {psdid}")
-        return None
+    scraped = {psdid: names for psdid, names in zip(missing, results) if names}
+    cache_kato_names(scraped)
 
-    except requests.exceptions.RequestException as e:
-        print(f"  ❌ HTTP Error scraping psdid {psdid}: {e}")
-        return None
-    except Exception as e:
-        print(f"  ❌ Parsing error for psdid {psdid}: {e}")
-        return None
+    kato_names_by_psdid.update(zip(missing, results))
+    return {psdid: kato_names_by_psdid[psdid] for psdid in psdids}
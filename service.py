@@ -1,15 +1,50 @@
-import requests
-from typing import List, Dict
-from config import API_URL, ROWS_PER_PAGE
-from models import Project
+import asyncio
+import json
+import aiohttp
+import orjson
+import pyarrow as pa
+import pyarrow.compute as pc
+from typing import Dict, Optional
+from config import (
+    API_URL, ROWS_PER_PAGE, PAGE_FETCH_CONCURRENCY,
+    HTTP_HEADERS, API_NAME_FIELD, API_STATUS_FIELD
+)
+from http_retry import send_with_retries
+from models import projects_table
+
+REGION_FILTER = 'Кызылорд'
+STATUS_FILTER = 'Согласован'
+
+
+def build_search_filters() -> Optional[str]:
+    """
+    Build jqGrid search filters for REGION_FILTER / STATUS_FILTER.
+
+    Returns:
+        Filters JSON, or None if the API field names are not configured
+    """
+    if not API_NAME_FIELD or not API_STATUS_FIELD:
+        return None
 
+    return json.dumps({
+        "groupOp": "AND",
+        "rules": [
+            {"field": API_NAME_FIELD, "op": "cn", "data": REGION_FILTER},
+            {"field": API_STATUS_FIELD, "op": "eq", "data": STATUS_FILTER}
+        ]
+    }, ensure_ascii=False)
 
-def fetch_projects_page(page: int) -> Dict:
+
+async def fetch_projects_page(
+    session: aiohttp.ClientSession, page: int, filters: Optional[str] = None
+) -> Optional[Dict]:
     """
-    Fetch a single page of projects from the API.
+    Fetch a single page of projects from the API, retrying on 5xx responses.
 
     Args:
+        session: Shared aiohttp session
         page: Page number to fetch
+        filters: jqGrid filters JSON to apply server-side
 
     Returns:
         Dict containing API response with total pages, records, and rows
@@ -20,59 +55,90 @@ def fetch_projects_page(page: int) -> Dict:
         "sidx": "id",
         "sord": "desc"
     }
+    if filters:
+        payload["_search"] = "true"
+        payload["filters"] = filters
+
+    async def post():
+        # The body must be read before the response is released
+        async with session.post(API_URL, data=payload) as response:
+            return response, await response.read()
 
     try:
-        response = requests.post(API_URL, data=payload)
+        response, body = await send_with_retries(
+            post, lambda r: r[0].status, (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+        )
         response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
+        return orjson.loads(body)
+    except (aiohttp.ClientError, asyncio.TimeoutError, orjson.JSONDecodeError) as e:
         print(f"Error fetching page {page}: {e}")
         return None
 
 
-def fetch_all_projects() -> List[Project]:
+def filter_projects(projects: pa.Table) -> pa.Table:
     """
-    Fetch all projects from all pages.
+    Keep only approved Kyzylorda projects.
+    """
+    return projects.filter(pc.and_(
+        pc.match_substring(projects["project_name"], REGION_FILTER),
+        pc.equal(projects["status"], STATUS_FILTER)
+    ))
+
+
+async def fetch_all_projects_async() -> pa.Table:
+    """
+    Fetch all projects from all pages, requesting pages concurrently.
 
     Returns:
-        List of Project objects
+        Table of projects (see models.projects_table)
     """
-    all_projects = []
+    tables = []
 
-    # Fetch first page to get total pages
-    first_page = fetch_projects_page(1)
-    if not first_page:
-        return all_projects
+    connector = aiohttp.TCPConnector(limit=PAGE_FETCH_CONCURRENCY)
+    async with aiohttp.ClientSession(connector=connector, headers=HTTP_HEADERS) as session:
+        # Fetch first page to get total pages, filtering server-side if possible
+        filters = build_search_filters()
+        first_page = await fetch_projects_page(session, 1, filters)
+        if not first_page and filters:
+            print("Server-side filter rejected, falling back to client-side filtering")
+            filters = None
+            first_page = await fetch_projects_page(session, 1)
+        if not first_page:
+            return projects_table([])
 
-    total_pages = first_page.get("total", 1)
-    print(f"Total pages: {total_pages}")
+        total_pages = first_page.get("total", 1)
+        print(f"Total pages: {total_pages}")
 
-    # Process first page
-    page1_count = 0
-    for row in first_page.get("rows", []):
-        if 'Кызылорд' in row['cell'][2] and row['cell'][8] == 'Согласован':
-            project = Project(row)
-            all_projects.append(project)
-            page1_count += 1
+        # Fetch remaining pages
+        semaphore = asyncio.Semaphore(PAGE_FETCH_CONCURRENCY)
 
+        async def fetch(page):
+            async with semaphore:
+                return await fetch_projects_page(session, page, filters)
 
-    print(f"Page 1: Fetched {page1_count} filtered projects (out of {len(first_page.get('rows', []))} total)")
+        other_pages = await asyncio.gather(*(fetch(page) for page in range(2, total_pages + 1)))
 
-    # Fetch remaining pages
-    for page in range(2, total_pages + 1):
-        page_data = fetch_projects_page(page)
+    for page, page_data in enumerate([first_page, *other_pages], 1):
         if page_data:
             rows = page_data.get("rows", [])
-            page_count = 0
-            for row in rows:
-                if 'Кызылорд' in row['cell'][2] and row['cell'][8] == 'Согласован':
-                    project = Project(row)
-                    all_projects.append(project)
-                    page_count += 1
-            print(f"Page {page}: Fetched {page_count} filtered projects (out of {len(rows)} total)")
+            page_projects = filter_projects(projects_table(rows))
+            if page_projects.num_rows:
+                tables.append(page_projects)
+            print(f"Page {page}: Fetched {page_projects.num_rows} filtered projects (out of {len(rows)} total)")
+
+    projects = pa.concat_tables(tables) if tables else projects_table([])
+    print(f"Total projects fetched: {projects.num_rows}")
+    return projects
+
 
-    print(f"Total projects fetched: {len(all_projects)}")
-    return all_projects
+def fetch_all_projects() -> pa.Table:
+    """
+    Synchronous wrapper around fetch_all_projects_async().
+
+    Returns:
+        Table of projects (see models.projects_table)
+    """
+    return asyncio.run(fetch_all_projects_async())
 
 if __name__ == "__main__":
-    fetch_all_projects()
\ No newline at end of file
+    fetch_all_projects()
@@ -0,0 +1,48 @@
+import os
+import sys
+from contextlib import contextmanager
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import kato_matcher  # noqa: E402
+
+
+class _FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, query, params=None):
+        pass
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class _FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self):
+        return _FakeCursor(self.rows)
+
+
+@pytest.fixture
+def make_matcher(monkeypatch):
+    """
+    Build a KatoMatcher from (code, name_ru, parent_code, level) rows
+    instead of the katoCode table.
+    """
+    def make(rows):
+        @contextmanager
+        def connection():
+            yield _FakeConnection(rows)
+
+        monkeypatch.setattr(kato_matcher, "connection", connection)
+        return kato_matcher.KatoMatcher()
+
+    return make
@@ -0,0 +1,20 @@
+import pyarrow as pa
+
+from data import _dedupe_by_psdid
+
+
+def test_dedupe_keeps_last_occurrence_in_original_order():
+    projects = pa.table({
+        "id": [1, 2, 3, 4, 5],
+        "project_id": ["10", "20", "10", "30", "20"],
+        "status": ["old", "old", "new", "only", "new"],
+    })
+    deduped = _dedupe_by_psdid(projects)
+    assert deduped.column("id").to_pylist() == [3, 4, 5]
+    assert deduped.column("project_id").to_pylist() == ["10", "30", "20"]
+    assert deduped.column("status").to_pylist() == ["new", "only", "new"]
+
+
+def test_dedupe_returns_table_unchanged_without_duplicates():
+    projects = pa.table({"id": [1, 2], "project_id": ["10", "20"]})
+    assert _dedupe_by_psdid(projects) is projects
@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+import http_retry
+from config import HTTP_RETRIES
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    async def sleep(delay):
+        pass
+
+    monkeypatch.setattr(http_retry.asyncio, "sleep", sleep)
+
+
+def run(responses, retry_exceptions=()):
+    """
+    Feed responses (status codes or exceptions) to send_with_retries().
+    """
+    calls = []
+
+    async def send():
+        outcome = responses[len(calls)]
+        calls.append(outcome)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    result = asyncio.run(http_retry.send_with_retries(send, lambda status: status, retry_exceptions))
+    return result, len(calls)
+
+
+def test_retries_server_errors_until_success():
+    assert run([503, 502, 200]) == (200, 3)
+
+
+def test_returns_last_server_error_when_retries_run_out():
+    assert run([500] * (HTTP_RETRIES + 1)) == (500, HTTP_RETRIES + 1)
+
+
+def test_retries_listed_exceptions():
+    assert run([ConnectionError(), 200], (ConnectionError,)) == (200, 2)
+
+
+def test_reraises_after_last_attempt():
+    with pytest.raises(ConnectionError):
+        run([ConnectionError()] * (HTTP_RETRIES + 1), (ConnectionError,))
+
+
+def test_does_not_retry_other_exceptions():
+    with pytest.raises(ValueError):
+        run([ValueError(), 200], (ConnectionError,))
@@ -0,0 +1,29 @@
+KYZYLORDA_ROWS = [
+    ("430000000", "Кызылординская область", None, 1),
+    ("433000000", "Шиелийский район", "430000000", 2),
+]
+
+
+def test_hierarchical_match(make_matcher):
+    matcher = make_matcher(KYZYLORDA_ROWS)
+    names = ["Республика Казахстан", "Кызылординская обл.", "Шиелийский р-н"]
+    assert matcher.find_kato_code(names) == "433000000"
+
+
+def test_global_fallback_matches_partial_word(make_matcher):
+    matcher = make_matcher(KYZYLORDA_ROWS)
+    assert matcher.find_kato_code(["Шиели"]) == "433000000"
+
+
+def test_global_fallback_matches_name_inside_query(make_matcher):
+    matcher = make_matcher(KYZYLORDA_ROWS)
+    assert matcher.find_kato_code(["Неизвестно", "Шиелийский район (центр)"]) == "433000000"
+
+
+def test_fuzzy_match_uses_child_kept_for_duplicate_name(make_matcher):
+    # Both children normalize to "шиелийский район"; the children dict keeps the later one
+    rows = KYZYLORDA_ROWS + [("433200000", "Шиелийский  р-н", "430000000", 2)]
+    matcher = make_matcher(rows)
+    names = ["Кызылординская область", "Шиелийский кент"]
+    assert matcher.find_kato_code(names) == "433200000"
+    assert matcher.find_kato_code(["Кызылординская область", "Шиелийский район"]) == "433200000"
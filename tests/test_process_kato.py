@@ -0,0 +1,64 @@
+from concurrent.futures import Future
+
+import process_kato
+
+
+class _InlineExecutor:
+    """
+    Stand-in for ProcessPoolExecutor: every record of a batch matches code "1".
+    """
+
+    created = []
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.created.append(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def submit(self, fn, batch):
+        future = Future()
+        future.set_result([(psdid, "1") for psdid, _title in batch])
+        return future
+
+
+def test_failed_bulk_update_only_fails_its_batch(monkeypatch, capsys):
+    batch_sizes = []
+
+    def update_kato_codes_bulk(pairs):
+        batch_sizes.append(len(pairs))
+        if len(batch_sizes) == 2:
+            raise RuntimeError("simulated DB error")
+        # One psdid was deleted since it was streamed
+        return len(pairs) - 1
+
+    records = [(psdid, "title") for psdid in range(3 * process_kato.BATCH_SIZE)]
+    monkeypatch.setattr(process_kato, "ProcessPoolExecutor", _InlineExecutor)
+    monkeypatch.setattr(process_kato, "create_scrape_cache_table", lambda: None)
+    monkeypatch.setattr(process_kato, "iter_empty_kato_records", lambda: iter(records))
+    monkeypatch.setattr(process_kato, "update_kato_codes_bulk", update_kato_codes_bulk)
+
+    process_kato.process_kato_codes()
+
+    assert batch_sizes == [process_kato.BATCH_SIZE] * 3
+    output = capsys.readouterr().out
+    assert f"Success: {2 * (process_kato.BATCH_SIZE - 1)}" in output
+    assert f"Total: {len(records)}" in output
+
+
+def test_workers_stay_within_scrape_concurrency(monkeypatch):
+    monkeypatch.setattr(process_kato.os, "cpu_count", lambda: 4 * process_kato.SCRAPE_CONCURRENCY)
+    monkeypatch.setattr(process_kato, "ProcessPoolExecutor", _InlineExecutor)
+    monkeypatch.setattr(process_kato, "create_scrape_cache_table", lambda: None)
+    monkeypatch.setattr(process_kato, "iter_empty_kato_records", lambda: iter([]))
+
+    process_kato.process_kato_codes()
+
+    kwargs = _InlineExecutor.created[-1].kwargs
+    (share,) = kwargs["initargs"]
+    assert kwargs["max_workers"] == process_kato.SCRAPE_CONCURRENCY
+    assert kwargs["max_workers"] * share <= process_kato.SCRAPE_CONCURRENCY
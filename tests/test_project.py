@@ -0,0 +1,60 @@
+import datetime
+
+from models import projects_table
+
+
+def cells(overrides=None):
+    """
+    One API row "cell" list, with overrides {index: value} applied.
+    """
+    cell = ["1", "", "Проект", "Заказчик", "Проектировщик", "N-1", "01.02.2020", "Филиал", "Согласован", "", "Примечание"]
+    for index, value in (overrides or {}).items():
+        cell[index] = value
+    return cell
+
+
+def test_builds_typed_columns():
+    table = projects_table([{"id": 7, "cell": cells()}])
+    assert table.to_pylist() == [{
+        "id": 7,
+        "project_id": "1",
+        "project_name": "Проект",
+        "customer": "Заказчик",
+        "contractor": "Проектировщик",
+        "contract_number": "N-1",
+        "contract_date": datetime.date(2020, 2, 1),
+        "branch": "Филиал",
+        "status": "Согласован",
+        "note": "Примечание",
+    }]
+
+
+def test_missing_trailing_cells_are_null():
+    table = projects_table([{"id": 1, "cell": cells()}, {"id": 2, "cell": ["2", "", "Короткий"]}])
+    short = table.to_pylist()[1]
+    assert short["project_name"] == "Короткий"
+    assert short["status"] is None
+    assert short["note"] is None
+
+
+def test_missing_column_in_every_row_is_null():
+    table = projects_table([{"id": 1, "cell": ["1", "", "Короткий"]}])
+    assert table.column("note").to_pylist() == [None]
+    assert table.column("contract_date").to_pylist() == [None]
+
+
+def test_non_string_cells_are_stringified():
+    table = projects_table([{"id": 1, "cell": cells({0: 101, 5: None})}, {"id": 2, "cell": cells()}])
+    assert table.column("project_id").to_pylist() == ["101", "1"]
+    assert table.column("contract_number").to_pylist() == [None, "N-1"]
+
+
+def test_bad_contract_dates_are_null():
+    rows = [{"id": i, "cell": cells({6: date})} for i, date in enumerate(["31.12.2021", "2021-12-31", "", None])]
+    assert projects_table(rows).column("contract_date").to_pylist() == [datetime.date(2021, 12, 31), None, None, None]
+
+
+def test_empty_rows():
+    table = projects_table([])
+    assert table.num_rows == 0
+    assert "contract_date" in table.column_names
@@ -0,0 +1,17 @@
+from scraper import parse_kato_names
+
+LOCATION_ROW = (
+    '<table class="simple"><tr><td>Местоположение объекта</td>'
+    '<td>Республика Казахстан, Кызылординская область, Шиелийский район;</td></tr></table>'
+)
+EXPECTED = ["Республика Казахстан", "Кызылординская область", "Шиелийский район"]
+
+
+def test_parses_page_with_xml_declaration():
+    page = f'<?xml version="1.0" encoding="utf-8"?><html><body>{LOCATION_ROW}</body></html>'
+    assert parse_kato_names(page.encode("utf-8"), 1, "utf-8") == EXPECTED
+
+
+def test_detects_meta_charset_without_header_encoding():
+    page = f'<html><head><meta charset="utf-8"></head><body>{LOCATION_ROW}</body></html>'
+    assert parse_kato_names(page.encode("utf-8"), 1) == EXPECTED
@@ -0,0 +1,21 @@
+from models import projects_table
+from service import filter_projects
+
+
+def row(psdid, name, status):
+    return {"id": psdid, "cell": [str(psdid), "", name, "", "", "", "", "", status]}
+
+
+def test_keeps_only_approved_kyzylorda_projects():
+    rows = [
+        row(1, "Школа в г. Кызылорда", "Согласован"),
+        row(2, "Школа в г. Кызылорда", "На рассмотрении"),
+        row(3, "Школа в г. Алматы", "Согласован"),
+        row(4, "Дорога, Кызылординская область", "Согласован"),
+        {"id": 5, "cell": ["5"]},
+    ]
+    assert filter_projects(projects_table(rows)).column("id").to_pylist() == [1, 4]
+
+
+def test_empty_page():
+    assert filter_projects(projects_table([])).num_rows == 0